@@ -1,8 +1,29 @@
 import streamlit as st
+import asyncio
+import collections
 import json
-import re
-import pandas as pd
-import plotly.express as px
+import random
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import numpy as np
+
+# pandas and plotly are deliberately NOT imported here: the dashboard
+# renders lists/dicts directly and the chart helper imports plotly
+# lazily, keeping ~500ms of import time off the cold-start path.
+
+from nutrition_core import (
+    MACRO_KEYS,
+    calculate_bmi,
+    calculate_tdee,
+    get_bmi_category,
+    get_calorie_target,
+    local_workout_burn,
+    meal_tokens,
+    parse_llm_json,
+    nutrition_vector,
+)
 
 # ----------------------------
 # 0. PAGE CONFIG (Must be first)
@@ -12,61 +33,183 @@ st.set_page_config(layout="wide", page_title="AI Diet & Fitness Coach")
 # ----------------------------
 # 1. IMPORTS & SETUP
 # ----------------------------
-try:
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.output_parsers import StrOutputParser
-    from langchain_google_genai import ChatGoogleGenerativeAI
-except ImportError:
-    st.error("Dependencies missing. Please ensure requirements.txt is installed correctly.")
-    st.stop()
+# The LangChain stack is imported lazily inside the cached factories
+# below: only the first script run per process pays the import cost, and
+# a missing dependency still surfaces as a clean st.error at startup.
 
 # ----------------------------
 # 2. CONSTANTS
 # ----------------------------
 GLASS_ML = 250          # 1 glass = 250 ml
 WATER_GOAL_LITRES = 2.5 # Global average hydration goal
+DB_PATH = "nutrisync.db"  # per-day meal/workout log, survives page refreshes
+KCAL_PER_GRAM = np.array([4.0, 4.0, 9.0])  # protein, carbs, fats
+
+def consumption_dict():
+    """Readable {key: value} view of the running totals vector."""
+    return dict(zip(MACRO_KEYS, st.session_state.total_consumption.tolist()))
 
 # ----------------------------
 # 3. HELPER FUNCTIONS
 # ----------------------------
-def clean_json_response(response_text):
-    """Extract JSON block from model output."""
-    # Remove markdown code blocks if present (```json ... ```)
-    text = re.sub(r'```json\s*', '', response_text)
-    text = re.sub(r'```', '', text)
-    
-    match = re.search(r"\{.*\}", text, re.DOTALL)
-    return match.group(0) if match else None
-
-def calculate_tdee(gender, weight, height, age, activity_level):
-    if gender == "Male":
-        bmr = 10 * weight + 6.25 * height - 5 * age + 5
-    else:
-        bmr = 10 * weight + 6.25 * height - 5 * age - 161
+def find_similar_meal(desc):
+    """Look up a previously analyzed meal with the same content words.
 
-    multipliers = {
-        "Sedentary": 1.2,
-        "Lightly Active": 1.375,
-        "Moderately Active": 1.55,
-        "Very Active": 1.725,
+    Matches on stopword-filtered token-set equality: "a bowl of oatmeal
+    with berries" still reuses "oatmeal w/ berries", but "2 eggs and
+    toast" never reuses "2 eggs" — a fuzzy-overlap match silently
+    dropping added foods from the totals costs more than the extra LLM
+    call it saves.
+    """
+    tokens = meal_tokens(desc)
+    if not tokens:
+        return None
+    for seen_tokens, nutrition in st.session_state.get("analyzed_meals", []):
+        if seen_tokens == tokens:
+            return nutrition
+    return None
+
+def remember_analyzed_meal(desc, nutrition):
+    """Record an analyzed meal for future near-duplicate lookups."""
+    st.session_state.analyzed_meals.append((meal_tokens(desc), nutrition))
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def compute_energy_profile(gender, weight, height, age, activity_level, goal):
+    """Memoized TDEE/target/BMI bundle.
+
+    Profile inputs only change on form submit, but the sidebar math ran
+    on every rerun; one cache lookup now replaces the four calls.
+    """
+    tdee = calculate_tdee(gender, weight, height, age, activity_level)
+    bmi = calculate_bmi(weight, height)
+    return {
+        "tdee": tdee,
+        "calorie_target": get_calorie_target(tdee, goal),
+        "bmi": bmi,
+        "bmi_category": get_bmi_category(bmi),
     }
-    return bmr * multipliers.get(activity_level, 1.2)
 
-def get_calorie_target(tdee, goal):
-    if goal == "Weight Loss": return tdee - 500
-    if goal == "Weight Gain": return tdee + 500
-    return tdee
+@st.cache_data(show_spinner=False)
+def macro_pie(protein_kcal, carbs_kcal, fats_kcal):
+    """Donut chart of macro calories, memoized on the three scalars.
+
+    Goes straight to graph_objects with plain lists — no DataFrame — and
+    reruns with unchanged totals reuse the cached figure instead of
+    rebuilding and re-serializing it.
+    """
+    import plotly.graph_objects as go
+    fig = go.Figure(go.Pie(
+        values=[protein_kcal, carbs_kcal, fats_kcal],
+        labels=["Protein", "Carbs", "Fats"],
+        hole=0.4
+    ))
+    fig.update_layout(title="Macro Split")
+    fig.update_traces(textposition="inside", textinfo="percent+label")
+    return fig
+
+@st.cache_resource(show_spinner=False)
+def get_db():
+    """Open the on-disk log database once per process."""
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS meals ("
+        "day TEXT, meal_type TEXT, description TEXT, "
+        "calories REAL, protein_g REAL, carbs_g REAL, fats_g REAL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS workouts ("
+        "day TEXT, description TEXT, calories_burned REAL)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS water (day TEXT, ml INTEGER)")
+    conn.commit()
+    return conn
+
+@st.cache_resource(show_spinner=False)
+def get_latency_log():
+    """Bounded process-wide latency log; safe to append from worker threads.
+
+    Process scope (not session_state) is deliberate: timings are
+    recorded inside cache_data-wrapped analyzers running on executor
+    threads, which cannot touch session state. The maxlen keeps this
+    debugging aid from growing for the life of the process.
+    """
+    return collections.deque(maxlen=128)
+
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    """Shared worker pool so LLM analysis doesn't block the script thread."""
+    return ThreadPoolExecutor(max_workers=4)
 
-def calculate_bmi(weight_kg, height_cm):
-    if height_cm <= 0: return 0
-    h_m = height_cm / 100
-    return weight_kg / (h_m ** 2)
+def record_latency(name, seconds, chars, ttft=None):
+    """Append one row to the latency log shown in the sidebar."""
+    get_latency_log().append({
+        "chain": name,
+        "seconds": round(seconds, 2),
+        "ttft_s": round(ttft, 2) if ttft is not None else None,
+        "chars": chars,
+    })
 
-def get_bmi_category(bmi):
-    if bmi < 18.5: return "Underweight"
-    if bmi < 24.9: return "Normal weight"
-    if bmi < 29.9: return "Overweight"
-    return "Obesity"
+MAX_LLM_ATTEMPTS = 4
+
+def _is_transient(exc):
+    """True for rate limits and server-side hiccups worth retrying.
+
+    Matched on the exception text so no google.api_core import is
+    needed; bad requests and parse errors fall through immediately.
+    """
+    text = f"{type(exc).__name__} {exc}"
+    return any(marker in text for marker in (
+        "429", "ResourceExhausted", "RateLimit", "500", "503",
+        "ServiceUnavailable", "DeadlineExceeded", "timed out"))
+
+def timed_ainvoke(chain, name, payload):
+    """Run chain.ainvoke and record wall-clock latency.
+
+    Transient Gemini failures retry with exponential backoff plus jitter
+    instead of surfacing a bare error the user must click through again.
+    """
+    t0 = time.perf_counter()
+    delay = 0.5
+    for attempt in range(MAX_LLM_ATTEMPTS):
+        try:
+            out = asyncio.run(chain.ainvoke(payload))
+            break
+        except Exception as e:
+            if attempt == MAX_LLM_ATTEMPTS - 1 or not _is_transient(e):
+                raise
+            time.sleep(delay + random.uniform(0, 0.25))
+            delay *= 2
+    record_latency(name, time.perf_counter() - t0, len(out))
+    return out
+
+def timed_stream(chain, name, payload):
+    """Yield chain.stream chunks, recording time-to-first-token and total.
+
+    Only failures before the first token are retried — once output has
+    streamed to the page, replaying from scratch would duplicate it.
+    """
+    t0 = time.perf_counter()
+    delay = 0.5
+    for attempt in range(MAX_LLM_ATTEMPTS):
+        stream = chain.stream(payload)
+        try:
+            first = next(stream, None)
+            break
+        except Exception as e:
+            if attempt == MAX_LLM_ATTEMPTS - 1 or not _is_transient(e):
+                raise
+            time.sleep(delay + random.uniform(0, 0.25))
+            delay *= 2
+    ttft = None
+    chars = 0
+    if first is not None:
+        ttft = time.perf_counter() - t0
+        chars = len(first)
+        yield first
+        for chunk in stream:
+            chars += len(chunk)
+            yield chunk
+    record_latency(name, time.perf_counter() - t0, chars, ttft)
 
 # ----------------------------
 # 4. LLM & PROMPT SETUP
@@ -77,53 +220,81 @@ if "GOOGLE_API_KEY" not in st.secrets:
     st.error("Missing Google API Key. Please set `GOOGLE_API_KEY` in your Streamlit Secrets.")
     st.stop()
 
-try:
-    llm = ChatGoogleGenerativeAI(
+@st.cache_resource(show_spinner=False)
+def get_llm():
+    """Return one Gemini client shared across reruns and sessions.
+
+    The google-generativeai SDK underneath keeps a pooled HTTP transport
+    per client, so reusing a single instance amortizes TCP + TLS setup
+    instead of paying it again whenever Streamlit reruns the script.
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
         model="gemini-2.5-flash",
         api_key=st.secrets["GOOGLE_API_KEY"],
         temperature=0.7
     )
-except Exception as e:
-    st.error(f"Error initializing Gemini: {e}")
-    st.stop()
 
-# Prompts
-prompt_meal_analyzer = ChatPromptTemplate.from_template(
+@st.cache_resource(show_spinner=False)
+def get_llm_json():
+    """Gemini client constrained to emit application/json responses.
+
+    Used by the analyzer chains: constrained decoding means the model
+    returns parseable JSON directly, with no markdown fences to strip
+    and no silent regex-extraction failures.
+    """
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        api_key=st.secrets["GOOGLE_API_KEY"],
+        temperature=0.7,
+        response_mime_type="application/json"
+    )
+
+# Prompt texts (plain strings; the template objects are built once
+# inside get_chains below).
+# JSON mode (response_mime_type) guarantees parseable output server-side,
+# so the prompts only name the expected keys — no "MUST be ONLY valid
+# JSON / no markdown" boilerplate burning input tokens on every call.
+MEAL_PROMPT = (
     "You are a nutrition analysis expert. Analyze the following meal description "
-    "and provide a reasonable estimate for its nutritional content.\n"
-    "Your response MUST be ONLY a valid JSON object with the keys "
-    "'calories' (number), 'protein_g' (number), 'carbs_g' (number), and 'fats_g' (number). "
-    "Do not include any other text or markdown formatting.\n\n"
-    "Meal: {meal_description}\n\n"
-    "JSON Output:"
+    "and provide a reasonable estimate for its nutritional content, as a JSON "
+    "object with numeric keys 'calories', 'protein_g', 'carbs_g', 'fats_g'.\n\n"
+    "Meal: {meal_description}"
+)
+
+MEAL_BATCH_PROMPT = (
+    "You are a nutrition analysis expert. For EACH meal in the JSON list below, "
+    "provide a reasonable estimate for its nutritional content. Respond with a "
+    "JSON array of one object per meal, each echoing that meal's 'id' and adding "
+    "numeric keys 'calories', 'protein_g', 'carbs_g', 'fats_g'.\n\n"
+    "Meals: {meals_json}"
 )
 
-prompt_workout_analyzer = ChatPromptTemplate.from_template(
+# Past ~8 meals per call the response gets slow enough that splitting
+# into parallel-ish sequential calls wins back latency.
+MEAL_BATCH_SIZE = 8
+
+WORKOUT_PROMPT = (
     "You are a fitness expert. Analyze the following workout and user profile to "
-    "estimate calories burned.\n"
-    "Your response MUST be ONLY a valid JSON object with the key 'calories_burned' (number). "
-    "Do not include any other text or markdown formatting.\n\n"
+    "estimate calories burned, as a JSON object with the numeric key "
+    "'calories_burned'.\n\n"
     "Workout: {workout_description}\n"
-    "User: {user_profile}\n\n"
-    "JSON Output:"
+    "User: {user_profile}"
 )
 
-prompt_daily_coach = ChatPromptTemplate.from_template(
+# The long coaching instructions live in a static system message and the
+# per-click user data in a short human message. Keeping the big prefix
+# byte-identical across calls lets Gemini's implicit prompt cache skip
+# re-prefilling it, so repeat "Get Insights" clicks get cheaper/faster.
+COACH_SYSTEM_PROMPT = (
     "You are a structured, encouraging AI Diet & Fitness Coach.\n"
     "YOUR ENTIRE RESPONSE MUST BE IN CLEAN MARKDOWN WITH HEADINGS, BULLET LISTS, "
     "AND CLEAR SPACING. KEEP EACH PARAGRAPH UNDER 3 LINES. DO NOT RETURN WALLS OF TEXT.\n\n"
-    "------------------------\n"
+    "The user message contains today's profile and log data. Structure your "
+    "response with exactly these sections:\n\n"
     "### 👤 User Summary\n"
-    "- **Profile:** {user_profile}\n"
-    "- **Primary Goal:** {goal}\n"
-    "- **BMI Category:** {bmi_category}\n"
-    "- **Base Calorie Target:** {calorie_target} kcal\n"
-    "- **Adjusted Calorie Target (with workouts):** {adjusted_calorie_target} kcal\n"
-    "- **Calories Burned from Workouts:** {calories_burned} kcal\n"
-    "- **Meals Logged:** {logged_meals_summary}\n"
-    "- **Today's Intake:** {total_consumption}\n"
-    "- **Water Intake:** {water_litres} L / {water_goal_litres} L goal\n"
-    "------------------------\n\n"
+    "- Restate the profile, goal, targets, intake, and water data as short bullets.\n\n"
     "### 📈 Daily Summary & Insights\n"
     "- Start with a short, motivating summary.\n"
     "- Compare intake vs adjusted calorie target (over, under, or on track).\n"
@@ -141,10 +312,153 @@ prompt_daily_coach = ChatPromptTemplate.from_template(
     "- Add a short recovery tip (sleep, stretching, light movement) if workouts are logged.\n"
 )
 
-# Chains
-meal_analyzer_chain = prompt_meal_analyzer | llm | StrOutputParser()
-workout_analyzer_chain = prompt_workout_analyzer | llm | StrOutputParser()
-daily_coach_chain = prompt_daily_coach | llm | StrOutputParser()
+COACH_USER_PROMPT = (
+    "- Profile: {user_profile}\n"
+    "- Primary Goal: {goal}\n"
+    "- BMI Category: {bmi_category}\n"
+    "- Base Calorie Target: {calorie_target} kcal\n"
+    "- Adjusted Calorie Target (with workouts): {adjusted_calorie_target} kcal\n"
+    "- Calories Burned from Workouts: {calories_burned} kcal\n"
+    "- Meals Logged: {logged_meals_summary}\n"
+    "- Workouts Logged: {logged_workouts_summary}\n"
+    "- Today's Intake: {total_consumption}\n"
+    "- Water Intake: {water_litres} L / {water_goal_litres} L goal\n"
+)
+
+# Weekly recap: same static-system / dynamic-human split as the daily
+# coach so the instruction prefix stays cacheable.
+RECAP_SYSTEM_PROMPT = (
+    "You are a structured, encouraging AI Diet & Fitness Coach reviewing a "
+    "user's past week.\n"
+    "YOUR ENTIRE RESPONSE MUST BE IN CLEAN MARKDOWN WITH HEADINGS, BULLET LISTS, "
+    "AND CLEAR SPACING. KEEP EACH PARAGRAPH UNDER 3 LINES.\n\n"
+    "The user message contains their profile and a JSON list with one entry per "
+    "logged day (calories in, workout calories burned, water litres). Structure "
+    "your response with exactly these sections:\n\n"
+    "### 📆 Week in Review\n"
+    "- Summarize intake vs target, workout consistency, and hydration across the week.\n\n"
+    "### ✅ Wins\n"
+    "- Call out 2-3 concrete things that went well.\n\n"
+    "### 🎯 Focus for Next Week\n"
+    "- Give 2-3 specific, achievable adjustments aligned with their goal.\n"
+)
+
+RECAP_USER_PROMPT = (
+    "- Profile: {user_profile}\n"
+    "- Primary Goal: {goal}\n"
+    "- Daily Calorie Target: {calorie_target} kcal\n"
+    "- Daily Water Goal: {water_goal_litres} L\n"
+    "- Daily Logs: {week_json}\n"
+)
+
+# Chains (analyzers use the JSON-mode client; the coach emits markdown).
+# Template construction and LCEL composition both build validated object
+# graphs, so all of it lives behind cache_resource: one build per
+# process, shared across reruns and sessions.
+@st.cache_resource(show_spinner=False)
+def get_chains():
+    """Build the prompt | llm | parser pipelines once and reuse them."""
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
+
+    llm = get_llm()
+    llm_json = get_llm_json()
+    parser = StrOutputParser()
+    prompt_daily_coach = ChatPromptTemplate.from_messages([
+        ("system", COACH_SYSTEM_PROMPT),
+        ("human", COACH_USER_PROMPT),
+    ])
+    prompt_weekly_recap = ChatPromptTemplate.from_messages([
+        ("system", RECAP_SYSTEM_PROMPT),
+        ("human", RECAP_USER_PROMPT),
+    ])
+    return {
+        "meal": ChatPromptTemplate.from_template(MEAL_PROMPT) | llm_json | parser,
+        "meal_batch": ChatPromptTemplate.from_template(MEAL_BATCH_PROMPT) | llm_json | parser,
+        "workout": ChatPromptTemplate.from_template(WORKOUT_PROMPT) | llm_json | parser,
+        "coach": prompt_daily_coach | llm | parser,
+        "recap": prompt_weekly_recap | llm | parser,
+    }
+
+try:
+    _chains = get_chains()
+except ImportError:
+    st.error("Dependencies missing. Please ensure requirements.txt is installed correctly.")
+    st.stop()
+except Exception as e:
+    st.error(f"Error initializing Gemini: {e}")
+    st.stop()
+meal_analyzer_chain = _chains["meal"]
+meal_batch_chain = _chains["meal_batch"]
+workout_analyzer_chain = _chains["workout"]
+daily_coach_chain = _chains["coach"]
+weekly_recap_chain = _chains["recap"]
+
+# Cached analysis wrappers: repeated descriptions skip the Gemini round trip
+# entirely. Keys are normalized (stripped + lowercased) before the call.
+# Parse failures raise so they are never cached; callers keep their try/except.
+# persist="disk" keeps hits across app restarts and deploys, not just reruns.
+@st.cache_data(ttl=86400, max_entries=512, persist="disk", show_spinner=False)
+def analyze_meal_cached(meal_description):
+    """Analyze a meal description, caching the parsed nutrition dict."""
+    resp = timed_ainvoke(meal_analyzer_chain, "meal", {"meal_description": meal_description})
+    nutr = parse_llm_json(resp)
+    if not isinstance(nutr, dict):
+        raise ValueError("Meal analysis returned no parseable JSON object.")
+    return nutr
+
+def analyze_meals_concurrent(meal_descriptions):
+    """Analyze several meal descriptions concurrently: ~1x latency for N calls.
+
+    Uses abatch with bounded concurrency so a big backlog doesn't slam
+    Gemini's free-tier requests-per-minute ceiling all at once. Fallback
+    for when the single-call batch analysis comes back malformed: one
+    request per meal can't mis-align results across meals.
+    """
+    responses = asyncio.run(meal_analyzer_chain.abatch(
+        [{"meal_description": d} for d in meal_descriptions],
+        config={"max_concurrency": 8},
+    ))
+    results = [parse_llm_json(r) for r in responses]
+    if not all(isinstance(r, dict) for r in results):
+        raise ValueError("Meal analysis returned no parseable JSON object.")
+    return results
+
+def analyze_meals_batched(meal_descriptions):
+    """Analyze several meal descriptions with one LLM call per batch of 8.
+
+    Rows are id-tagged so results are matched back explicitly rather
+    than by array position, which survives the model reordering or
+    dropping an entry.
+    """
+    results = [None] * len(meal_descriptions)
+    for start in range(0, len(meal_descriptions), MEAL_BATCH_SIZE):
+        chunk = meal_descriptions[start:start + MEAL_BATCH_SIZE]
+        rows = [{"id": start + i, "description": d} for i, d in enumerate(chunk)]
+        resp = timed_ainvoke(meal_batch_chain, "meal_batch",
+                             {"meals_json": json.dumps(rows)})
+        parsed = parse_llm_json(resp)
+        if not isinstance(parsed, list):
+            raise ValueError("Batch analysis did not return a JSON array.")
+        for row in parsed:
+            idx = row.get("id")
+            if isinstance(idx, int) and start <= idx < start + len(chunk):
+                results[idx] = {k: row.get(k, 0) for k in MACRO_KEYS}
+    if any(r is None for r in results):
+        raise ValueError("Batch analysis did not return one result per meal.")
+    return results
+
+@st.cache_data(ttl=86400, max_entries=512, persist="disk", show_spinner=False)
+def analyze_workout_cached(workout_description, gender, weight, age):
+    """Estimate calories burned, caching on description + profile."""
+    resp = timed_ainvoke(workout_analyzer_chain, "workout", {
+        "workout_description": workout_description,
+        "user_profile": f"{gender}, {weight}kg, {age}yo"
+    })
+    data = parse_llm_json(resp)
+    if not isinstance(data, dict):
+        raise ValueError("Workout analysis returned no parseable JSON object.")
+    return data
 
 # ----------------------------
 # 5. STATE INITIALIZATION
@@ -155,15 +469,139 @@ if "meals" not in st.session_state:
         "Evening Snack": [], "Dinner": [], "Dessert": []
     }
 if "total_consumption" not in st.session_state:
-    st.session_state.total_consumption = {"calories": 0.0, "protein_g": 0.0, "carbs_g": 0.0, "fats_g": 0.0}
+    st.session_state.total_consumption = np.zeros(4, dtype=np.float64)
 if "workouts" not in st.session_state:
     st.session_state.workouts = []
 if "calories_burned" not in st.session_state:
     st.session_state.calories_burned = 0.0
 if "water_ml" not in st.session_state:
     st.session_state.water_ml = 0
+# Bounded: water entries are only kept for provenance and the similarity
+# cache only needs recent meals, so neither should grow all session.
 if "water_logs" not in st.session_state:
-    st.session_state.water_logs = []
+    st.session_state.water_logs = collections.deque(maxlen=64)
+if "analyzed_meals" not in st.session_state:
+    st.session_state.analyzed_meals = collections.deque(maxlen=256)
+if "pending_meals" not in st.session_state:
+    st.session_state.pending_meals = []
+if "pending_analyses" not in st.session_state:
+    st.session_state.pending_analyses = []
+# Flat views maintained at insert time so reruns don't re-scan the
+# nested meals dict just to render or summarize the log.
+if "log_rows" not in st.session_state:
+    st.session_state.log_rows = []
+if "meals_flat" not in st.session_state:
+    st.session_state.meals_flat = []
+if "workouts_flat" not in st.session_state:
+    st.session_state.workouts_flat = []
+
+def log_meal(m_type, description, nutrition, persist=True):
+    """Fold one analyzed meal into session state (and the on-disk log)."""
+    st.session_state.meals[m_type].append({"description": description, "nutrition": nutrition})
+    st.session_state.total_consumption += nutrition_vector(nutrition)
+    st.session_state.log_rows.append(
+        {"Type": m_type, "Description": description, "kcal": round(nutrition.get("calories", 0))})
+    st.session_state.meals_flat.append(f"{m_type}: {description}")
+    remember_analyzed_meal(description.strip().lower(), nutrition)
+    if persist:
+        conn = get_db()
+        conn.execute(
+            "INSERT INTO meals VALUES (?,?,?,?,?,?,?)",
+            (date.today().isoformat(), m_type, description,
+             *(float(nutrition.get(k, 0)) for k in MACRO_KEYS)))
+        conn.commit()
+
+def log_workout(description, calories_burned, persist=True):
+    """Fold one analyzed workout into session state (and the on-disk log)."""
+    st.session_state.workouts.append({"description": description, "calories_burned": calories_burned})
+    st.session_state.calories_burned += calories_burned
+    st.session_state.log_rows.append(
+        {"Type": "Workout", "Description": description, "kcal": -round(calories_burned)})
+    st.session_state.workouts_flat.append(description)
+    if persist:
+        conn = get_db()
+        conn.execute(
+            "INSERT INTO workouts VALUES (?,?,?)",
+            (date.today().isoformat(), description, float(calories_burned)))
+        conn.commit()
+
+def log_water(ml, persist=True):
+    """Fold one water entry into session state (and the on-disk log)."""
+    st.session_state.water_ml += ml
+    st.session_state.water_logs.append(ml)
+    if persist:
+        conn = get_db()
+        conn.execute("INSERT INTO water VALUES (?,?)", (date.today().isoformat(), ml))
+        conn.commit()
+
+def hydrate_from_db():
+    """Reload today's persisted logs into a fresh session.
+
+    A page refresh drops session state; replaying rows from sqlite means
+    returning users get their day back with zero LLM re-analysis.
+    """
+    today = date.today().isoformat()
+    conn = get_db()
+    rows = conn.execute(
+        "SELECT meal_type, description, calories, protein_g, carbs_g, fats_g "
+        "FROM meals WHERE day=?", (today,))
+    for m_type, desc, cal, prot, carb, fat in rows:
+        nutr = {"calories": cal, "protein_g": prot, "carbs_g": carb, "fats_g": fat}
+        st.session_state.meals.setdefault(m_type, [])
+        log_meal(m_type, desc, nutr, persist=False)
+    for desc, burned in conn.execute(
+            "SELECT description, calories_burned FROM workouts WHERE day=?", (today,)):
+        log_workout(desc, burned, persist=False)
+    for (ml,) in conn.execute("SELECT ml FROM water WHERE day=?", (today,)):
+        log_water(ml, persist=False)
+
+def weekly_summary():
+    """Per-day totals for the last 7 days, straight from sqlite.
+
+    Returns a list of {"day", "meals", "kcal_in", "kcal_burned",
+    "water_l"} dicts for days with any activity, oldest first.
+    """
+    conn = get_db()
+    start = (date.today() - timedelta(days=6)).isoformat()
+    days = {}
+    for day, n, kcal in conn.execute(
+            "SELECT day, COUNT(*), SUM(calories) FROM meals "
+            "WHERE day>=? GROUP BY day", (start,)):
+        days.setdefault(day, {}).update(meals=n, kcal_in=round(kcal))
+    for day, burned in conn.execute(
+            "SELECT day, SUM(calories_burned) FROM workouts "
+            "WHERE day>=? GROUP BY day", (start,)):
+        days.setdefault(day, {})["kcal_burned"] = round(burned)
+    for day, ml in conn.execute(
+            "SELECT day, SUM(ml) FROM water WHERE day>=? GROUP BY day", (start,)):
+        days.setdefault(day, {})["water_l"] = round(ml / 1000, 2)
+    return [{"day": d, **v} for d, v in sorted(days.items())]
+
+if "hydrated" not in st.session_state:
+    st.session_state.hydrated = True
+    hydrate_from_db()
+
+def drain_pending_analyses():
+    """Fold finished background analyses into session state."""
+    still_pending = []
+    for job in st.session_state.pending_analyses:
+        if not job["future"].done():
+            still_pending.append(job)
+            continue
+        # The fold stays inside the try: if a result turns out malformed,
+        # one warning drops that job instead of re-raising on every rerun
+        # with the job wedged in the pending list.
+        try:
+            result = job["future"].result()
+            if job["kind"] == "meal":
+                log_meal(job["m_type"], job["description"], result)
+            else:
+                log_workout(job["description"], result.get("calories_burned", 0))
+        except Exception as e:
+            st.warning(f"Analysis failed for '{job['description']}': {e}")
+    st.session_state.pending_analyses = still_pending
+
+drain_pending_analyses()
 
 # ----------------------------
 # 6. SIDEBAR UI
@@ -181,10 +619,10 @@ with st.sidebar:
         goal = st.selectbox("Primary Goal", ["Weight Loss", "Maintenance", "Weight Gain"])
         st.form_submit_button("Update Profile")
 
-    tdee = calculate_tdee(gender, weight, height, age, activity_level)
-    calorie_target = get_calorie_target(tdee, goal)
-    bmi = calculate_bmi(weight, height)
-    bmi_category = get_bmi_category(bmi)
+    profile = compute_energy_profile(gender, weight, height, age, activity_level, goal)
+    calorie_target = profile["calorie_target"]
+    bmi = profile["bmi"]
+    bmi_category = profile["bmi_category"]
 
     st.info(f"**BMI:** {bmi:.1f} ({bmi_category})")
     st.success(f"**Base Target:** {calorie_target:,.0f} kcal")
@@ -193,40 +631,79 @@ with st.sidebar:
     workout_input = st.text_input("Describe workout:", placeholder="e.g., 30 mins running")
     if st.button("Log Workout"):
         if workout_input.strip():
-            with st.spinner("Analyzing..."):
-                try:
-                    resp = workout_analyzer_chain.invoke({
-                        "workout_description": workout_input, 
-                        "user_profile": f"{gender}, {weight}kg, {age}yo"
-                    })
-                    data = json.loads(clean_json_response(resp))
-                    burned = data.get("calories_burned", 0)
-                    st.session_state.workouts.append({"description": workout_input, "calories_burned": burned})
-                    st.session_state.calories_burned += burned
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"Error logging workout: {e}")
+            # "30 mins running"-style inputs are a deterministic MET
+            # lookup — log instantly and keep Gemini for the rest.
+            burned = local_workout_burn(workout_input, weight)
+            if burned is not None:
+                log_workout(workout_input, burned)
+            else:
+                st.session_state.pending_analyses.append({
+                    "kind": "workout", "description": workout_input,
+                    "future": get_executor().submit(
+                        analyze_workout_cached, workout_input.strip().lower(), gender, weight, age),
+                })
 
     st.header("💧 Hydration")
-    water_l = st.session_state.water_ml / 1000.0
-    st.metric("Water", f"{water_l:.2f} L", f"Goal: {WATER_GOAL_LITRES} L")
-    col_w1, col_w2 = st.columns(2)
-    if col_w1.button("+ 1 Glass"):
-        st.session_state.water_ml += GLASS_ML
-        st.session_state.water_logs.append({"type": "glass", "ml": GLASS_ML})
-        st.rerun()
-    
-    add_l = col_w2.number_input("Add L", 0.0, 5.0, 0.0, 0.25, label_visibility="collapsed")
-    if col_w2.button("Add"):
-        if add_l > 0:
-            st.session_state.water_ml += int(add_l * 1000)
-            st.session_state.water_logs.append({"type": "litres", "ml": int(add_l * 1000)})
-            st.rerun()
+
+    @st.fragment
+    def render_water_panel():
+        """Hydration metric + buttons; a tap reruns only this fragment."""
+        water_l = st.session_state.water_ml / 1000.0
+        st.metric("Water", f"{water_l:.2f} L", f"Goal: {WATER_GOAL_LITRES} L")
+        col_w1, col_w2 = st.columns(2)
+
+        def _add_litres():
+            if st.session_state.add_litres > 0:
+                log_water(int(st.session_state.add_litres * 1000))
+
+        # on_click callbacks mutate state before the rerun renders, so the
+        # metric above is already fresh — no explicit st.rerun per tap.
+        col_w1.button("+ 1 Glass", on_click=log_water, args=(GLASS_ML,))
+        col_w2.number_input("Add L", 0.0, 5.0, 0.0, 0.25,
+                            key="add_litres", label_visibility="collapsed")
+        col_w2.button("Add", on_click=_add_litres)
+
+    render_water_panel()
+
+    st.header("📆 Weekly Recap")
+
+    @st.fragment
+    def render_weekly_recap():
+        """One coach call over the last 7 days of persisted logs."""
+        if not st.button("Generate Weekly Recap", use_container_width=True):
+            return
+        week = weekly_summary()
+        if not week:
+            st.caption("No logged days yet.")
+            return
+        with st.spinner("Reviewing your week..."):
+            try:
+                recap_stream = timed_stream(weekly_recap_chain, "recap", {
+                    "user_profile": f"{age}yo {gender}, {weight}kg, {height}cm",
+                    "goal": goal,
+                    "calorie_target": f"{calorie_target:,.0f}",
+                    "water_goal_litres": str(WATER_GOAL_LITRES),
+                    "week_json": json.dumps(week, separators=(",", ":")),
+                })
+                st.write_stream(recap_stream)
+            except Exception as e:
+                st.error(f"Recap Error: {e}")
+
+    render_weekly_recap()
+
+    if get_latency_log():
+        with st.expander("⏱️ LLM Latency"):
+            st.dataframe(list(get_latency_log()), hide_index=True, use_container_width=True)
 
 # ----------------------------
 # 7. MAIN DASHBOARD
 # ----------------------------
 adjusted_target = calorie_target + st.session_state.calories_burned
+
+if st.session_state.pending_analyses:
+    in_flight = ", ".join(job["description"] for job in st.session_state.pending_analyses)
+    st.status(f"Analyzing in the background: {in_flight}", state="running")
+
 col1, col2 = st.columns([1, 1.2], gap="large")
 
 # Left: Meal Log
@@ -234,97 +711,158 @@ with col1:
     st.header("✍️ Log Meals")
     for m_type in st.session_state.meals.keys():
         with st.expander(f"Log {m_type}"):
-            txt = st.text_area(f"Describe {m_type}", key=f"txt_{m_type}")
-            if st.button(f"Add {m_type}", key=f"btn_{m_type}"):
-                if txt.strip():
-                    with st.spinner("Analyzing nutrition..."):
-                        try:
-                            resp = meal_analyzer_chain.invoke({"meal_description": txt})
-                            nutr = json.loads(clean_json_response(resp))
-                            st.session_state.meals[m_type].append({"description": txt, "nutrition": nutr})
-                            for k in st.session_state.total_consumption:
-                                st.session_state.total_consumption[k] += nutr.get(k, 0)
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error: {e}")
+            # Each panel is its own form: typing in one text area no
+            # longer reruns the script (and the other five panels) on
+            # every widget interaction — only submit does.
+            with st.form(f"form_{m_type}", border=False):
+                txt = st.text_area(f"Describe {m_type}", key=f"txt_{m_type}")
+                col_add, col_queue = st.columns(2)
+                add_clicked = col_add.form_submit_button(f"Add {m_type}")
+                queue_clicked = col_queue.form_submit_button(
+                    "Queue", help="Add to the pending batch without analyzing yet.")
+            # No explicit st.rerun() here: the dashboard, pending caption,
+            # and polling loop all render after this point in the same
+            # pass, so forcing a second full pass per click is waste.
+            if add_clicked and txt.strip():
+                desc = txt.strip().lower()
+                nutr = find_similar_meal(desc)
+                if nutr is not None:
+                    log_meal(m_type, txt, nutr)
+                else:
+                    st.session_state.pending_analyses.append({
+                        "kind": "meal", "m_type": m_type, "description": txt,
+                        "future": get_executor().submit(analyze_meal_cached, desc),
+                    })
+            if queue_clicked and txt.strip():
+                st.session_state.pending_meals.append((m_type, txt))
+
+    pending = st.session_state.pending_meals
+    if pending:
+        st.caption("Pending: " + "; ".join(f"{mt}: {d}" for mt, d in pending))
+        if st.button(f"Analyze all pending ({len(pending)})"):
+            with st.spinner("Analyzing batch..."):
+                try:
+                    descs = [d for _, d in pending]
+                    try:
+                        results = analyze_meals_batched(descs)
+                    except ValueError:
+                        # Batch rows didn't line up — fan out one
+                        # concurrent call per meal instead of erroring.
+                        results = analyze_meals_concurrent(descs)
+                    for (m_type, d), nutr in zip(pending, results):
+                        log_meal(m_type, d, nutr)
+                    st.session_state.pending_meals = []
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error: {e}")
 
 # Right: Stats
-with col2:
+@st.fragment
+def render_dashboard(adjusted_target):
+    """Metrics, macro chart, and log table, isolated from other panels."""
     st.header("📊 Dashboard")
-    consumed = st.session_state.total_consumption["calories"]
+    consumed = st.session_state.total_consumption[0]
     remaining = adjusted_target - consumed
-    
+
     c1, c2, c3 = st.columns(3)
     c1.metric("Target", f"{adjusted_target:,.0f}")
     c2.metric("Consumed", f"{consumed:,.0f}")
     c3.metric("Remaining", f"{remaining:,.0f}", delta_color="inverse")
-    
+
     st.progress(min(consumed / adjusted_target, 1.0) if adjusted_target > 0 else 0)
 
     # Chart
-    macros = st.session_state.total_consumption
-    macro_data = {
-        "Protein": macros["protein_g"] * 4,
-        "Carbs": macros["carbs_g"] * 4,
-        "Fats": macros["fats_g"] * 9
-    }
-    if sum(macro_data.values()) > 0:
-        df = pd.DataFrame(list(macro_data.items()), columns=["Macro", "Cals"])
-        fig = px.pie(df, values="Cals", names="Macro", title="Macro Split", hole=0.4)
-        fig.update_traces(textposition="inside", textinfo="percent+label")
-        st.plotly_chart(fig, use_container_width=True)
+    protein_kcal, carbs_kcal, fats_kcal = (
+        st.session_state.total_consumption[1:] * KCAL_PER_GRAM)
+    if protein_kcal + carbs_kcal + fats_kcal > 0:
+        st.plotly_chart(macro_pie(protein_kcal, carbs_kcal, fats_kcal), use_container_width=True)
     else:
         st.info("Log meals to see data.")
 
     # List Log
     with st.container(border=True, height=300):
         st.subheader("Today's Log")
-        has_data = False
-        for mt, items in st.session_state.meals.items():
-            if items:
-                st.markdown(f"**{mt}**")
-                for i in items:
-                    n = i['nutrition']
-                    st.text(f"- {i['description']} ({n['calories']:.0f} cal)")
-                has_data = True
-        if st.session_state.workouts:
-            st.markdown("**Workouts**")
-            for w in st.session_state.workouts:
-                st.text(f"- {w['description']} (-{w['calories_burned']:.0f} cal)")
-            has_data = True
-        
-        if not has_data: st.caption("No activity yet.")
+        # One table instead of N markdown widgets: a single payload over
+        # the websocket and one virtualized component in the browser.
+        # Rows are maintained at insert time, so no per-rerun re-scan.
+        log_rows = st.session_state.log_rows
+        if log_rows:
+            st.dataframe(log_rows, hide_index=True, use_container_width=True)
+        else:
+            st.caption("No activity yet.")
+
+with col2:
+    render_dashboard(adjusted_target)
 
 # ----------------------------
 # 8. AI COACH
 # ----------------------------
 st.divider()
-if st.button("🧠 Get Coach Insights", type="primary", use_container_width=True):
-    # Prepare summary text
-    meals_txt = []
-    for mt, items in st.session_state.meals.items():
-        for i in items: meals_txt.append(f"{mt}: {i['description']}")
-    
-    workouts_txt = [w['description'] for w in st.session_state.workouts]
-    
+
+@st.fragment
+def render_coach(age, gender, weight, height, goal, bmi_category,
+                 calorie_target, adjusted_target):
+    """Coach button + streamed advice; a click reruns only this fragment."""
+    if not st.button("🧠 Get Coach Insights", type="primary", use_container_width=True):
+        return
+    # Flat summaries are maintained at insert time — no nested loops here
+    meals_txt = st.session_state.meals_flat
+    workouts_txt = st.session_state.workouts_flat
+    water_l = st.session_state.water_ml / 1000.0
+
     if not meals_txt and not workouts_txt:
         st.warning("Log something first!")
     else:
+        # Fingerprint of everything the coach advice depends on. A second
+        # click without new logs replays the cached markdown instead of
+        # paying for a full regeneration of near-identical advice.
+        coach_key = (
+            goal, bmi_category, round(adjusted_target, -1),
+            tuple((mt, len(items)) for mt, items in st.session_state.meals.items()),
+            len(st.session_state.workouts),
+            round(water_l, 2),
+        )
+        cached_key, cached_advice = st.session_state.get("coach_cache", (None, None))
+        if cached_key == coach_key:
+            st.markdown(cached_advice)
+            return
+        # Compact JSON (double quotes, no spaces, rounded floats) instead
+        # of Python repr: fewer input tokens and an unambiguous format for
+        # the model. Built before the spinner so the latency log measures
+        # only the LLM call.
+        payload = {
+            "user_profile": f"{age}yo {gender}, {weight}kg, {height}cm",
+            "goal": goal,
+            "bmi_category": bmi_category,
+            "calorie_target": f"{calorie_target:,.0f}",
+            "adjusted_calorie_target": f"{adjusted_target:,.0f}",
+            "logged_meals_summary": json.dumps(meals_txt, separators=(",", ":")),
+            "total_consumption": json.dumps(
+                {k: round(v, 1) for k, v in consumption_dict().items()},
+                separators=(",", ":")),
+            "logged_workouts_summary": json.dumps(workouts_txt, separators=(",", ":")),
+            "calories_burned": f"{st.session_state.calories_burned:.0f}",
+            "water_litres": f"{water_l:.2f}",
+            "water_goal_litres": str(WATER_GOAL_LITRES),
+        }
         with st.spinner("Coach is thinking..."):
             try:
-                advice = daily_coach_chain.invoke({
-                    "user_profile": f"{age}yo {gender}, {weight}kg, {height}cm",
-                    "goal": goal,
-                    "bmi_category": bmi_category,
-                    "calorie_target": f"{calorie_target:,.0f}",
-                    "adjusted_calorie_target": f"{adjusted_target:,.0f}",
-                    "logged_meals_summary": "; ".join(meals_txt) or "None",
-                    "total_consumption": str(st.session_state.total_consumption),
-                    "logged_workouts_summary": "; ".join(workouts_txt) or "None",
-                    "calories_burned": str(st.session_state.calories_burned),
-                    "water_litres": f"{water_l:.2f}",
-                    "water_goal_litres": str(WATER_GOAL_LITRES)
-                })
-                st.markdown(advice)
+                advice_stream = timed_stream(daily_coach_chain, "coach", payload)
+                # Render tokens as they arrive: first words appear in ~200ms
+                # instead of after the whole response is generated.
+                advice = st.write_stream(advice_stream)
+                st.session_state.coach_cache = (coach_key, advice)
             except Exception as e:
-                st.error(f"Coach Error: {e}")
\ No newline at end of file
+                st.error(f"Coach Error: {e}")
+
+render_coach(age, gender, weight, height, goal, bmi_category,
+             calorie_target, adjusted_target)
+# ----------------------------
+# 9. BACKGROUND POLLING
+# ----------------------------
+# The page above has fully rendered; if analyses are still in flight,
+# rerun shortly so drain_pending_analyses() can fold in finished results
+# without the user clicking anything. The UI stays interactive meanwhile.
+if st.session_state.pending_analyses:
+    time.sleep(0.5)
+    st.rerun()
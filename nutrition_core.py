@@ -0,0 +1,168 @@
+"""Pure nutrition and parsing helpers for NutriSync.
+
+Everything here is Streamlit-free: no session state, no widgets, no LLM
+clients. That keeps the module cheap to import and lets the UI code in
+app.py stay focused on wiring.
+"""
+
+import json
+import re
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# Column order of the consumption totals vector
+MACRO_KEYS = ("calories", "protein_g", "carbs_g", "fats_g")
+
+
+# TDEE multipliers for the fixed activity-level choices in the sidebar.
+# Frozen at import so calculate_tdee doesn't rebuild a dict per call —
+# it runs on every Streamlit rerun.
+ACTIVITY_MULTIPLIERS = {
+    "Sedentary": 1.2,
+    "Lightly Active": 1.375,
+    "Moderately Active": 1.55,
+    "Very Active": 1.725,
+}
+
+# Compiled once at import: tokenization runs on every similarity lookup,
+# so skip the per-call cache probe inside `re`.
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Filler words ignored when comparing meal descriptions, so "oatmeal w/
+# berries" and "a bowl of oatmeal with berries" resolve to the same meal.
+_MEAL_STOPWORDS = {
+    "a", "an", "and", "bowl", "cup", "glass", "of", "one", "plate",
+    "plus", "some", "the", "w", "with",
+}
+
+
+def loads_json(text):
+    """Parse a JSON string, using orjson's Rust parser when available."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _outer_slice(text, open_ch, close_ch):
+    """Slice from the first opener to the last closer, or None.
+
+    One find + one rfind instead of a DOTALL regex scan: fences and prose
+    around the JSON fall outside the outermost brackets, so they are
+    dropped for free without re-materializing the string.
+    """
+    start = text.find(open_ch)
+    end = text.rfind(close_ch)
+    if start < 0 or end < start:
+        return None
+    return text[start:end + 1]
+
+
+def parse_llm_json(text):
+    """Parse JSON out of an LLM response: fast path first, salvage second.
+
+    JSON-mode responses are bare JSON, so the stripped text usually parses
+    directly with no extraction at all. If the model still wrapped its
+    output (fences, prose), fall back to slicing out the outermost object
+    or array — trying whichever opener appears first, so a wrapped array
+    of objects is recovered as the array rather than mistaken for its
+    first element. Returns None when nothing parseable is found.
+    """
+    s = text.strip()
+    try:
+        return loads_json(s)
+    except ValueError:
+        pass
+    blocks = [_outer_slice(s, "{", "}"), _outer_slice(s, "[", "]")]
+    if blocks[1] is not None and (blocks[0] is None or s.find("[") < s.find("{")):
+        blocks.reverse()
+    for block in blocks:
+        if block is None:
+            continue
+        try:
+            return loads_json(block)
+        except ValueError:
+            continue
+    return None
+
+
+def meal_tokens(desc):
+    """Content-word token set for a normalized meal description."""
+    return {t for t in _TOKEN_RE.findall(desc) if t not in _MEAL_STOPWORDS}
+
+
+def nutrition_vector(nutrition):
+    """Pack a nutrition dict into a MACRO_KEYS-ordered float vector."""
+    return np.fromiter((nutrition.get(k, 0) for k in MACRO_KEYS), dtype=np.float64, count=4)
+
+
+# MET (metabolic equivalent) values for common activities, so routine
+# workouts resolve locally instead of costing a Gemini round trip.
+MET_VALUES = {
+    "running": 9.8, "run": 9.8,
+    "jogging": 7.0, "jog": 7.0,
+    "walking": 3.5, "walk": 3.5,
+    "cycling": 7.5, "biking": 7.5,
+    "swimming": 8.0, "swim": 8.0,
+    "rowing": 7.0,
+    "hiking": 6.0,
+    "yoga": 2.5,
+    "pilates": 3.0,
+    "dancing": 4.5,
+    "hiit": 8.0,
+    "weightlifting": 5.0, "weights": 5.0, "lifting": 5.0,
+    "skipping": 11.0,
+}
+
+_MINUTES_RE = re.compile(r"(\d+(?:\.\d+)?)\s*min")
+
+
+def local_workout_burn(description, weight_kg):
+    """Deterministic MET-based calorie estimate, or None.
+
+    kcal = MET * weight_kg * hours. Needs an explicit "<N> min" duration
+    and a recognized activity word anywhere in the description; anything
+    else returns None so the caller can fall back to the LLM.
+    """
+    desc = description.lower()
+    match = _MINUTES_RE.search(desc)
+    if not match:
+        return None
+    minutes = float(match.group(1))
+    for token in _TOKEN_RE.findall(desc):
+        met = MET_VALUES.get(token)
+        if met is not None:
+            return met * weight_kg * minutes / 60.0
+    return None
+
+
+def calculate_tdee(gender, weight, height, age, activity_level):
+    if gender == "Male":
+        bmr = 10 * weight + 6.25 * height - 5 * age + 5
+    else:
+        bmr = 10 * weight + 6.25 * height - 5 * age - 161
+
+    return bmr * ACTIVITY_MULTIPLIERS.get(activity_level, 1.2)
+
+
+def get_calorie_target(tdee, goal):
+    if goal == "Weight Loss": return tdee - 500
+    if goal == "Weight Gain": return tdee + 500
+    return tdee
+
+
+def calculate_bmi(weight_kg, height_cm):
+    if height_cm <= 0: return 0
+    h_m = height_cm / 100
+    return weight_kg / (h_m ** 2)
+
+
+def get_bmi_category(bmi):
+    if bmi < 18.5: return "Underweight"
+    if bmi < 24.9: return "Normal weight"
+    if bmi < 29.9: return "Overweight"
+    return "Obesity"